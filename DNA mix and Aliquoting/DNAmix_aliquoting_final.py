@@ -1,5 +1,6 @@
 from opentrons import protocol_api
 from opentrons.protocol_api import SINGLE, ALL
+from contextlib import contextmanager
 
 metadata = {
     'protocolName': 'DNA Mix Aliquoting',
@@ -13,11 +14,12 @@ requirements = {
 }
 
 
-def add_parameters(parameters):
-    # List of valid well options (A1–H12)
-    well_choices = [{"value": f"{row}{col}", "display_name": f"{row}{col}"}
-                    for row in "ABCDEFGH" for col in range(1, 13)]
+# List of valid well options (A1–H12), built once at import
+_WELL_CHOICES = tuple({"value": f"{row}{col}", "display_name": f"{row}{col}"}
+                      for row in "ABCDEFGH" for col in range(1, 13))
+
 
+def add_parameters(parameters):
     # Number of mix wells to prepare
     parameters.add_int(
         display_name="mix count",
@@ -54,7 +56,7 @@ def add_parameters(parameters):
         display_name="Reagent Position",
         description="Position of the Eppendorf containing NaCl + PEI reagent",
         default="D6",
-        choices=well_choices
+        choices=_WELL_CHOICES
     )
 
     # First destination well for mix on PCR plate
@@ -63,7 +65,7 @@ def add_parameters(parameters):
         display_name="Mix Position",
         description="Starting well for mixes on PCR plate",
         default="C1",
-        choices=well_choices
+        choices=_WELL_CHOICES
     )
 
     # How many rows of PCR plate will contain mix wells
@@ -102,7 +104,7 @@ def add_parameters(parameters):
         display_name="Starting Tip (200 µL)",
         description="First tip to pick up in the 200 µL tip rack",
         default="A1",
-        choices=well_choices
+        choices=_WELL_CHOICES
     )
 
     # Custom starting tip for 1000 µL tips
@@ -111,7 +113,7 @@ def add_parameters(parameters):
         display_name="Starting Tip (1000 µL)",
         description="First tip to pick up in the 1000 µL tip rack",
         default="A1",
-        choices=well_choices
+        choices=_WELL_CHOICES
     )
 
     # Select reagent tube rack type
@@ -177,18 +179,15 @@ def run(protocol: protocol_api.ProtocolContext):
     p1000.configure_nozzle_layout(style=SINGLE, start="H1")  # Single nozzle mode
 
     # Create linear list of tips by row (A1 → H12)
-    tips1000_by_row = sum(tiprack_1000.rows(), [])
-    tips200_by_row = sum(tiprack_200.rows(), [])
+    tips1000_by_row = [tip for row in tiprack_1000.rows() for tip in row]
+    tips200_by_row = [tip for row in tiprack_200.rows() for tip in row]
 
-    # Locating selected starting tip index in rack
-    def find_tip_index(tip_list, well_name):
-        for i, tip in enumerate(tip_list):
-            if tip.well_name == well_name:
-                return i
-        raise ValueError(f"Starting tip {well_name} not found in tip list.")
+    # Locating selected starting tip index in rack (row-major: A1 → A12, B1 → ...)
+    def find_tip_index(well_name):
+        return "ABCDEFGH".index(well_name[0]) * 12 + int(well_name[1:]) - 1
 
-    tips200_by_row = tips200_by_row[find_tip_index(tips200_by_row, starting_tip_200):]
-    tips1000_by_row = tips1000_by_row[find_tip_index(tips1000_by_row, starting_tip_1000):]
+    tips200_by_row = tips200_by_row[find_tip_index(starting_tip_200):]
+    tips1000_by_row = tips1000_by_row[find_tip_index(starting_tip_1000):]
 
     # Tip usage counters
     counter_1000 = 0
@@ -198,6 +197,16 @@ def run(protocol: protocol_api.ProtocolContext):
     p1000.flow_rate.aspirate = 35
     p1000.flow_rate.dispense = 57
 
+    # High-speed flow rates for mixing only; gentle rates are restored on exit
+    @contextmanager
+    def fast_flow_rate():
+        p1000.flow_rate.aspirate = p1000.flow_rate.dispense = 716
+        try:
+            yield
+        finally:
+            p1000.flow_rate.aspirate = 35
+            p1000.flow_rate.dispense = 57
+
     # Reagent source
     source = reagent_plate[reagent_eppendorf]
 
@@ -232,46 +241,61 @@ def run(protocol: protocol_api.ProtocolContext):
             protocol.pause("Tip pickup failed.")
             raise
 
-    # Volume tracking for efficient reagent transfer
-    vol_in_tip = 0
-    well_index = 0
+    # Multi-dispense: one aspirate per group of wells that fits in the tip. Each well is
+    # budgeted reagent + air gap, so the reagent plus the gap held between dispenses stays
+    # below 90% of the tip
+    air_gap_vol = 5
+    wells_per_aspirate = max(1, int(1000 * 0.9 // (reagent_vol + air_gap_vol)))  # Maintain safe max volume
+
+    # Pre-mix reagent once, before the first aspirate
+    if premix:
+        with fast_flow_rate():
+            p1000.mix(3, premixvol, source)
+
+    # Reagent goes down the PCR plate column by column, alternating direction,
+    # so consecutive dispenses are always neighbouring wells
+    def column_serpentine(well):
+        row, col = well.well_name[0], int(well.well_name[1:])
+        return (col, ord(row) if col % 2 else -ord(row))
+
+    reagent_order = sorted(destination_wells, key=column_serpentine)
 
     # Distribute reagent across all mix wells
-    while well_index < mix_count:
-        remaining_wells = mix_count - well_index
-
-        if vol_in_tip < reagent_vol:
-            to_aspirate = min(1000 * 0.9, remaining_wells * reagent_vol)  # Maintain safe max volume
-            if premix:
-                p1000.flow_rate.aspirate = 716
-                p1000.flow_rate.dispense = 716
-                p1000.mix(3, premixvol, source)  # Pre-mix reagent
-                p1000.flow_rate.aspirate = 35
-                p1000.flow_rate.dispense = 57
-            p1000.aspirate(to_aspirate, source)
-            vol_in_tip = to_aspirate
-
-        # Dispense into each mix well
-        p1000.dispense(reagent_vol, destination_wells[well_index].top(0))
-        p1000.air_gap(5)
-        vol_in_tip -= reagent_vol
-        well_index += 1
+    for chunk_start in range(0, mix_count, wells_per_aspirate):
+        chunk = reagent_order[chunk_start:chunk_start + wells_per_aspirate]
+
+        p1000.aspirate(reagent_vol * len(chunk), source)
+
+        # Dispense into each mix well of the group. After the first well the air gap left by
+        # the previous dispense sits at the tip end, so it is pushed out with the reagent
+        for i, well in enumerate(chunk):
+            p1000.dispense(reagent_vol + air_gap_vol if i else reagent_vol, well.top(0))
+            if i < len(chunk) - 1:
+                p1000.air_gap(air_gap_vol)
 
     p1000.drop_tip()
 
     # Incubation before aliquoting
     protocol.delay(minutes=delay)
 
-    # Aliquot each mix into 4 wells of the cell plate
-    for i, source_well in enumerate(destination_wells):
-        # Plate layout logic: 6 mixes per block, 4 blocks total
+    # Tip size for the aliquot step is the same for every mix: it has to hold
+    # both the 4 aliquots and the pre-aspirate mix volume
+    use_200_tips = max(aliquot_vol * 4, reagent_vol) <= 200
+
+    # Plate layout logic: 6 mixes per block, 4 blocks total; target wells resolved once
+    cell_wells = cell_plate.wells_by_name()
+    mix_targets = []
+    for i in range(mix_count):
         block = (i // 6) % 4
         col = (i % 6) + 1 + (6 if block in [2, 3] else 0)
-        rows_block = ['A', 'B', 'C', 'D'] if block % 2 == 0 else ['E', 'F', 'G', 'H']
-        target_locs = [cell_plate[f"{r}{col}"] for r in rows_block]
+        rows_block = "ABCD" if block % 2 == 0 else "EFGH"
+        mix_targets.append([cell_wells[f"{r}{col}"] for r in rows_block])
+
+    # Aliquot each mix into 4 wells of the cell plate
+    for source_well, target_locs in zip(destination_wells, mix_targets):
 
-        # Pick correct tip size based on total aspired volume
-        if aliquot_vol * 4 <= 200:
+        # One fresh tip per mix; the 4 target wells of a mix share it
+        if use_200_tips:
             tip = tips200_by_row[counter_200]
             counter_200 += 1
         else:
@@ -284,15 +308,13 @@ def run(protocol: protocol_api.ProtocolContext):
             protocol.pause("Tip pickup failed.")
             raise
 
-        # Mix at high speed then aspirate & dispense into 4 wells
-        p1000.flow_rate.aspirate = p1000.flow_rate.dispense = 716
-        p1000.mix(5, reagent_vol, source_well)
-        p1000.flow_rate.aspirate = 35
-        p1000.flow_rate.dispense = 57
+        # Mix at high speed then distribute into 4 wells
+        with fast_flow_rate():
+            p1000.mix(5, reagent_vol, source_well)
 
-        p1000.aspirate(aliquot_vol * 4, source_well)
-        for loc in target_locs:
-            p1000.dispense(aliquot_vol, loc)
+        # Single aspirate, then dispense into the 4 wells; leftover goes back to the mix well
+        p1000.distribute(aliquot_vol, source_well, target_locs, new_tip='never',
+                         disposal_volume=0, blow_out=True, blowout_location='source well')
 
         p1000.drop_tip()
 
@@ -1,7 +1,10 @@
 from opentrons import protocol_api
 from opentrons.protocol_api import SINGLE
 import csv
-from collections import defaultdict
+import math
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import NamedTuple
 
 
 metadata = {
@@ -15,9 +18,45 @@ requirements = {
     'apiLevel': '2.20'
 }
 
-def add_parameters(parameters):
-    well_choices = [{"value": f"{row}{col}", "display_name": f"{row}{col}"} for row in "ABCDEFGH" for col in range(1, 13)]
+# List of valid well options (A1–H12), built once at import
+_WELL_CHOICES = tuple({"value": f"{row}{col}", "display_name": f"{row}{col}"}
+                      for row in "ABCDEFGH" for col in range(1, 13))
+
+# Mix volume before an aspirate: a fraction of the liquid in the tube, capped at the tip size
+def _mix_volume(total, cap=50.0, frac=0.8):
+    return min(total * frac, cap)
+
+
+# Pipetting plan of one mix: small and normal (volume, source well) transfers, the
+# final PCR transfer volume (original scale, NaCl included) and its pre-aspirate mix
+class _MixPlan(NamedTuple):
+    small: tuple
+    normal: tuple
+    total_volume: float
+    final_mix_vol: float
+
+
+# Plans are cached by recipe, so mixes sharing volumes, sources and scale are planned once.
+# NaCl sources are left out of small/normal; plasmids < 0.8 µL before rescaling go to the
+# intermediate mix, pipetted ×10
+@lru_cache(maxsize=256)
+def _plan_mix(volumes, sources, scale, excluded_sources):
+    small = []
+    normal = []
+    for vol, src in zip(volumes, sources):
+        if src in excluded_sources:
+            continue
+        if 0 < vol / scale < 0.8:
+            small.append((vol * 10, src))
+        else:
+            normal.append((vol, src))
+
+    inv_scale = 1 / scale
+    total_volume = inv_scale * sum(v for v in volumes if v > 0)
+    return _MixPlan(tuple(small), tuple(normal), total_volume, _mix_volume(total_volume))
+
 
+def add_parameters(parameters):
     parameters.add_int(
         display_name="Max num of plasmids per mix",
         variable_name="max_plasmid_count",
@@ -47,7 +86,7 @@ def add_parameters(parameters):
         display_name="Starting tip position (50)",
         description="Starting tip position for 50 µL tips",
         default="A1",
-        choices=well_choices
+        choices=_WELL_CHOICES
     )
 
     parameters.add_str(
@@ -55,7 +94,7 @@ def add_parameters(parameters):
         display_name="Starting tip (200)",
         description="Starting tip position for 200 µL tips",
         default="A1",
-        choices=well_choices
+        choices=_WELL_CHOICES
     )
 
     parameters.add_str(
@@ -106,64 +145,80 @@ def run(protocol: protocol_api.ProtocolContext):
     plasmid_plate = protocol.load_labware(plasmids_plate_type, 'D3')
     trash = protocol.load_trash_bin('A3')
 
+    # Well lookups by name, resolved once instead of Labware.__getitem__ in every transfer
+    plasmid_wells = plasmid_plate.wells_by_name()
+    pcr_wells = pcr_plate.wells_by_name()
+
     # Load pipettes
+    # Both 8-channel heads run on a single nozzle: every plasmid and NaCl source is one
+    # Eppendorf tube (19.3 mm pitch), so a full column of nozzles cannot aspirate from it,
+    # and the mixes on the PCR plate rarely share a source and volume down a whole column
     p1000 = protocol.load_instrument('flex_8channel_1000', 'right', tip_racks=[tiprack_200])
     p1000.configure_nozzle_layout(style=SINGLE, start="H1")
-    tips200_by_row = sum(tiprack_200.rows(), [])
+    tips200_by_row = [tip for row in tiprack_200.rows() for tip in row]
 
     p50 = protocol.load_instrument('flex_8channel_50', 'left', tip_racks=[tiprack_50])
     p50.configure_nozzle_layout(style=SINGLE, start="H1")
-    tips50_by_row = sum(tiprack_50.rows(), [])
+    tips50_by_row = [tip for row in tiprack_50.rows() for tip in row]
 
-    # Find starting tip index
-    def find_tip_index(tip_list, well_name):
-        for i, tip in enumerate(tip_list):
-            if tip.well_name == well_name:
-                return i
-        raise ValueError(f"Starting tip {well_name} not found in tip list.")
+    # Find starting tip index (row-major: A1 → A12, B1 → ...)
+    def find_tip_index(well_name):
+        return "ABCDEFGH".index(well_name[0]) * 12 + int(well_name[1:]) - 1
 
     def swap_rack50():
-        nonlocal tiprack_50, tiprack_50_reserve, tips50_by_row
+        nonlocal tiprack_50, tiprack_50_reserve
         protocol.comment(f"\n====== SWAPPING 50 µL TIP RACK ======")
 
         protocol.move_labware(tiprack_50, 'C4', use_gripper=True)
         protocol.move_labware(tiprack_50_reserve, 'B1', use_gripper=True)
 
         tiprack_50, tiprack_50_reserve = tiprack_50_reserve, tiprack_50
-        tips50_by_row = sum(tiprack_50.rows(), [])
-        counter_50 = 0
-
-
-    tips50_by_row = tips50_by_row[find_tip_index(tips50_by_row, starting_tip_50):]
-    tips200_by_row = tips200_by_row[find_tip_index(tips200_by_row, starting_tip_200):]
-
-    counter_200 = 0
-    counter_50 = 0
-    counter_50_f = 0
+        # Refill the same queue in place, so the pipette dispatch keeps pointing at it
+        tips50_by_row.clear()
+        tips50_by_row.extend(tip for row in tiprack_50.rows() for tip in row)
+
+
+    tips50_by_row = deque(tips50_by_row[find_tip_index(starting_tip_50):])
+    tips200_by_row = deque(tips200_by_row[find_tip_index(starting_tip_200):])
+
+    # Pipette dispatch, built once: tip queue, tip volume and tip usage per pipette
+    tip_queues = {p50: tips50_by_row, p1000: tips200_by_row}
+    tip_capacity = {p50: 50, p1000: 200}
+    tips_used = {p50: 0, p1000: 0}
+
+    def pipette_for(vol):
+        return p50 if vol <= 50 else p1000
+
+    def pick_up_tip(pipette):
+        tips = tip_queues[pipette]
+        try:
+            tip = tips.popleft()
+        except IndexError:
+            # Only the 50 µL rack has a reserve to swap in
+            if pipette != p50:
+                raise
+            swap_rack50()
+            tip = tips.popleft()
+        pipette.pick_up_tip(location=tip)
+        tips_used[pipette] += 1
 
     # --- Define plasmids from CSV ---
-    plasmid_name_rows = list(range(0, len(csv_data), 15))  # riga dei nomi ogni 15 righe
-    plasmid_well_rows = [row + 13 for row in plasmid_name_rows]
+    plasmid_name_rows = csv_data[0::15]  # riga dei nomi ogni 15 righe
+    plasmid_well_rows = csv_data[13::15]
 
     all_plasmid_wells = {}
+    seen_plasmid_wells = {}  # key = plasmid name, value = wells already listed (skip duplicates)
 
-    # Parse plasmid names and wells
+    # Parse plasmid names and wells (cells are already stripped, zip drops missing wells)
     for name_row, well_row in zip(plasmid_name_rows, plasmid_well_rows):
-        if name_row >= len(csv_data) or well_row >= len(csv_data):
-            continue
-        plasmid_names = [cell.strip() for cell in csv_data[name_row]]
-        for i in range(1, len(plasmid_names)):
-            name = plasmid_names[i]
-            if not name:
+        for name, well in zip(name_row[1:], well_row[1:]):
+            if not name or not well:
                 continue
-            well = csv_data[well_row][i].strip() if i < len(csv_data[well_row]) else ""
-            if well:
+            seen = seen_plasmid_wells.setdefault(name, set())
+            if well not in seen:
+                seen.add(well)
                 all_plasmid_wells.setdefault(name, []).append(well)
 
-    # Remove duplicates
-    for name in all_plasmid_wells:
-        all_plasmid_wells[name] = list(dict.fromkeys(all_plasmid_wells[name]))
-
     # Register liquids in the deck map
     plasmid_liquids = {}
     plasmid_well_map = {}
@@ -171,7 +226,7 @@ def run(protocol: protocol_api.ProtocolContext):
         liquid = protocol.define_liquid(name=name, description=f"Plasmid {name}", display_color="#3366FF")
         plasmid_liquids[name] = liquid
         for well in wells:
-            plasmid_plate[well].load_liquid(liquid, 1000)
+            plasmid_wells[well].load_liquid(liquid, 1000)
             plasmid_well_map[well] = name
         protocol.comment(f"{name} {wells}")
 
@@ -188,19 +243,33 @@ def run(protocol: protocol_api.ProtocolContext):
         row_index = 13 + 15 * mix_index
         if row_index >= len(csv_data):
             continue
-        row = [cell.strip() for cell in csv_data[row_index] if cell.strip()]
+        row = [cell for cell in csv_data[row_index] if cell]
         if not row:
             continue
         last_well = row[-1]
-        plasmid_plate[last_well].load_liquid(nacl_liquid, 1000)
+        if plasmid_well_map.get(last_well) == nacl_name:  # already registered by a previous mix
+            continue
+        plasmid_wells[last_well].load_liquid(nacl_liquid, 1000)
         plasmid_well_map[last_well] = nacl_name
         nacl_wells_all.append(last_well)
-    all_plasmid_wells[nacl_name] = list(dict.fromkeys(nacl_wells_all))
-    protocol.comment(f"{nacl_name} {list(dict.fromkeys(nacl_wells_all))}")
+    all_plasmid_wells[nacl_name] = nacl_wells_all
+    protocol.comment(f"{nacl_name} {nacl_wells_all}")
+    nacl_source_wells = frozenset(nacl_wells_all)
+
+
+    # Per-mix comments are collected and sent as one protocol.comment per step,
+    # instead of one server round-trip per line
+    run_log = []
 
+    def flush_log():
+        if run_log:
+            protocol.comment("\n".join(run_log))
+            run_log.clear()
 
     # --- Parse CSV for mixes ---
     all_mix_data = []
+    nacl_totals = defaultdict(float)  # key = source well name, value = total volume
+    nacl_dests = defaultdict(list)    # key = source well name, value = list of (mix, volume)
     try:
         for mix_index in range(mix_count):
             volume_row_index = 12 + (mix_index * 15)
@@ -212,7 +281,7 @@ def run(protocol: protocol_api.ProtocolContext):
 
             # Main plasmids
             for i in range(1, min(max_plasmid_count + 1, len(csv_data[volume_row_index]))):
-                vol_str = csv_data[volume_row_index][i].strip()
+                vol_str = csv_data[volume_row_index][i]
                 if not vol_str:
                     continue
 
@@ -222,15 +291,15 @@ def run(protocol: protocol_api.ProtocolContext):
                     continue
 
                 mix_volumes.append(vol)
-                source_wells.append(csv_data[source_row_index][i].strip() or f"A{i + 1}")
+                source_wells.append(csv_data[source_row_index][i] or f"A{i + 1}")
 
 
 
             # Rescale if <0.8 µL
             small_volumes = [v for v in mix_volumes if 0 < v < 0.8 ]
-            scale_factors = []
+            scale = 1
 
-            small_volumes_count = sum(1 for v in mix_volumes if 0 < v < 0.8 )
+            small_volumes_count = len(small_volumes)
 
 
             if small_volumes:
@@ -245,41 +314,50 @@ def run(protocol: protocol_api.ProtocolContext):
                 mix_volumes = [v * scale_factor for v in mix_volumes]
 
 
-                scale_factors.append(scale_factor)
+                scale = scale_factor
+
+                run_log.append(f"\nMix {mix_index + 1} had volume < 0.8  µL, volumes have been rescaled")
 
-                protocol.comment(f"\nMix {mix_index + 1} had volume < 0.8  µL, volumes have been rescaled")
-            else:
-                scale_factors = [1] * len(mix_volumes)
 
 
+            dest_well = csv_data[dest_row_index][0] if csv_data[dest_row_index] else "A1"
 
+            plan = _plan_mix(tuple(mix_volumes), tuple(source_wells), scale, nacl_source_wells)
 
-            dest_well = csv_data[dest_row_index][0].strip() if csv_data[dest_row_index] else "A1"
+            mix_data = {
+                'dest_well': dest_well,
+                'small': plan.small,
+                'normal': plan.normal,
+                'small_count': len(plan.small),
+                'has_small': len(plan.small) > 0,
+                'total_volume': plan.total_volume,
+                'final_mix_vol': plan.final_mix_vol
+            }
+            all_mix_data.append(mix_data)
 
-            all_mix_data.append({
-                'volumes': mix_volumes,
-                'scale_factors':scale_factors,
-                'source_wells': source_wells,
-                'dest_well': dest_well
-            })
+            # NaCl (last column) is gathered here for the multi-dispense
+            if mix_volumes and mix_volumes[-1] > 0:
+                nacl_totals[source_wells[-1]] += mix_volumes[-1]
+                nacl_dests[source_wells[-1]].append((mix_data, mix_volumes[-1]))
 
             volume_info = ", ".join([
                 f"{plasmid_well_map.get(well, 'Unknown')} : {vol} µL from {well}"
                 for vol, well in zip(mix_volumes, source_wells)
             ])
-            protocol.comment(f"\nMix {mix_index + 1} data: {volume_info}")
-            protocol.comment(f"Destination well: {dest_well}\n")
+            run_log.append(f"\nMix {mix_index + 1} data: {volume_info}")
+            run_log.append(f"Destination well: {dest_well}\n")
 
     except Exception as e:
+        flush_log()
         protocol.pause(f"Error parsing CSV: {str(e)}")
         return
 
+    flush_log()
 
-    # --- Define intermediate Eppendorf wells ---
-    intermediate_small_pool = [f"C{i}" for i in range(1, 7)]
-    intermediate_final_pool = [f"D{i}" for i in range(1, 7)]
 
-    intermediate_pool = intermediate_small_pool + intermediate_final_pool
+    # --- Define intermediate Eppendorf wells ---
+    intermediate_small_pool = deque(f"C{i}" for i in range(1, 7))
+    intermediate_final_pool = deque(f"D{i}" for i in range(1, 7))
 
     assigned_small_wells = {}
     assigned_final_wells = {}
@@ -293,10 +371,7 @@ def run(protocol: protocol_api.ProtocolContext):
     # Assign wells to mixes that contain small volumes
 
     for mix_data in all_mix_data:
-        scale = mix_data['scale_factors'][0]
-
-        small_volumes_count = sum(1 for v in mix_data['volumes'] if 0 < v/scale < 0.8 )
-
+        small_volumes_count = mix_data['small_count']
 
         if small_volumes_count > 1:
             # Serve sia small che final wells
@@ -304,327 +379,319 @@ def run(protocol: protocol_api.ProtocolContext):
                 protocol.pause("⚠️ Not enough Eppendorf wells available!")
                 break
 
-            small_well = intermediate_small_pool.pop(0)
-            final_well = intermediate_final_pool.pop(0)
+            small_well = intermediate_small_pool.popleft()
+            final_well = intermediate_final_pool.popleft()
 
             # Register them as liquids in deck map
-            plasmid_plate[small_well].load_liquid(intermediate_liquid, 0)
-            plasmid_plate[final_well].load_liquid(intermediate_liquid, 0)
+            plasmid_wells[small_well].load_liquid(intermediate_liquid, 0)
+            plasmid_wells[final_well].load_liquid(intermediate_liquid, 0)
 
             # Store mapping
             assigned_small_wells[mix_data['dest_well']] = small_well
             assigned_final_wells[mix_data['dest_well']] = final_well
 
-            protocol.comment(f"Intermediate SMALL well for {mix_data['dest_well']}: {small_well}")
-            protocol.comment(f"Intermediate FINAL well for {mix_data['dest_well']}: {final_well}")
+            run_log.append(f"Intermediate SMALL well for {mix_data['dest_well']}: {small_well}")
+            run_log.append(f"Intermediate FINAL well for {mix_data['dest_well']}: {final_well}")
 
         elif small_volumes_count == 1:
-            # Serve solo final well
-            if not intermediate_pool:
+            # Serve solo final well: take from the C row first, then the D row
+            if not intermediate_small_pool and not intermediate_final_pool:
                 protocol.pause("⚠️ Not enough Eppendorf wells available!")
                 break
 
-            final_well = intermediate_pool.pop(0)
+            final_well = (intermediate_small_pool or intermediate_final_pool).popleft()
 
-            plasmid_plate[final_well].load_liquid(intermediate_liquid, 0)
+            plasmid_wells[final_well].load_liquid(intermediate_liquid, 0)
             assigned_final_wells[mix_data['dest_well']] = final_well
 
-            protocol.comment(f"Intermediate FINAL well for {mix_data['dest_well']}: {final_well}")
+            run_log.append(f"Intermediate FINAL well for {mix_data['dest_well']}: {final_well}")
 
+    flush_log()
 
     heater_shaker.close_labware_latch()
 
-    # --- Calculate total NaCl for multi-dispensing ---
-    nacl_totals = defaultdict(float)  # key = source well name, value = total volume
-    nacl_dests = defaultdict(list)    # key = source well name, value = list of destinations
-
-    mix_has_small_volumes = {}
-
-    # Pre-scan mixes to determine which have small plasmid volumes
-    for mix_data in all_mix_data:
-        mix_has_small_volumes[mix_data['dest_well']] = any(0 < v < 0.8  for v in mix_data['volumes'])
-
-
-    for mix_data in all_mix_data:
-        dest_well_name = mix_data['dest_well']
-        nacl_vol = mix_data['volumes'][-1]
-
-
-        if nacl_vol <= 0:
-            continue
-
-        nacl_source_well_name = mix_data['source_wells'][-1]
-
-        if mix_has_small_volumes[dest_well_name]:
-            # If small volumes exist, NaCl goes to the final intermediate Eppendorf
-            final_epp = assigned_final_wells.get(dest_well_name)
-            if final_epp is not None:
-                dests = [(plasmid_plate[final_epp], nacl_vol)]
-            else:
-                # Fallback to PCR plate if Eppendorf not assigned
-                dests = [(pcr_plate[dest_well_name], nacl_vol)]
-        else:
-            # Otherwise, NaCl goes directly to PCR plate
-            dests = [(pcr_plate[dest_well_name], nacl_vol)]
-
-        nacl_totals[nacl_source_well_name] += nacl_vol
-        nacl_dests[nacl_source_well_name].extend(dests)
+    # If small volumes exist, NaCl goes to the final intermediate Eppendorf,
+    # otherwise (or if no Eppendorf was assigned) directly to the PCR plate
+    def nacl_destination(mix_data):
+        final_epp = assigned_final_wells.get(mix_data['dest_well']) if mix_data['has_small'] else None
+        if final_epp is not None:
+            return plasmid_wells[final_epp]
+        return pcr_wells[mix_data['dest_well']]
 
     # --- Execute NaCl multi-dispensing ---
     for source_well_name, total_vol in nacl_totals.items():
-        dest_list = nacl_dests[source_well_name]
-        source = plasmid_plate[source_well_name]
+        dest_list = [(nacl_destination(mix_data), vol) for mix_data, vol in nacl_dests[source_well_name]]
+        source = plasmid_wells[source_well_name]
         buffer = 2
 
-        max_vol = 50 if total_vol + buffer <= 50 else 200
-        pipette = p50 if max_vol == 50 else p1000
+        pipette = pipette_for(total_vol + buffer)
+        max_vol = tip_capacity[pipette]
 
-        if pipette == p50:
-            if not tips50_by_row:
-                swap_rack50()
-            pipette.pick_up_tip(location=tips50_by_row.pop(0))
-            counter_50 += 1
-            counter_50_f += 1
-        else:
-            pipette.pick_up_tip(location=tips200_by_row.pop(0))
-            counter_200 += 1
+        pick_up_tip(pipette)
 
-        group, current_sum = [], 0
-        grouped = []
-
-        for dest, vol in dest_list:
-            if  current_sum + vol <= max_vol - buffer:
-                group.append((dest, vol))
-                current_sum += vol
+        # First-Fit-Decreasing: pack destinations into as few aspirates as possible
+        bins = []  # [total volume, [(dest, vol), ...]] per aspirate
+        for dest, vol in sorted(dest_list, key=lambda d: d[1], reverse=True):
+            for b in bins:
+                if b[0] + vol <= max_vol - buffer:
+                    b[0] += vol
+                    b[1].append((dest, vol))
+                    break
             else:
-                grouped.append(group)
-                group, current_sum = [(dest, vol)], vol
-        if group:
-            grouped.append(group)
-            for g in grouped:
-                total = sum(v for _, v in g)
-                pipette.aspirate(total + buffer, source)
-                for dest, vol in g:
-                    pipette.dispense(vol, dest)
-                pipette.blow_out(source.top())
-
-            pipette.drop_tip()
+                bins.append([vol, [(dest, vol)]])
+
+        # Within one aspirate, visit the wells labware by labware, column by column
+        def plate_position(dest_vol):
+            well = dest_vol[0]
+            return (well.parent is pcr_plate, int(well.well_name[1:]), well.well_name[0])
+
+        for total, group in bins:
+            pipette.aspirate(total + buffer, source)
+            for dest, vol in sorted(group, key=plate_position):
+                pipette.dispense(vol, dest)
+            pipette.blow_out(source.top())
+
+        pipette.drop_tip()
 
         protocol.comment(
             f"Distributed NaCl from {source_well_name} to: {', '.join([d[0].well_name for d in dest_list])}"
         )
 
 
+    # --- Premix plasmid tubes before their first aspirate of each batch ---
+    # A p1000 transfer premixes with its own 200 µL tip; a p50 transfer needs a separate p1000 tip
+    # (single nozzle, see the note where the pipettes are loaded)
+    premixed_sources = set()
+
+    def premix_source(src, pipette):
+        if not premix or src in premixed_sources:
+            return
+
+        own_tip = pipette == p1000
+        if not own_tip:
+            pick_up_tip(p1000)
+        mix_vol = 200
+        mix_reps = 6
+        protocol.comment(f"\nPremix plasmid {plasmid_well_map.get(src, 'Unknown')} in {src} ({mix_reps}×{mix_vol} µL)")
+
+        src_well = plasmid_wells[src]
+        mix_bottom = src_well.bottom(1)
+        mix_top = src_well.bottom(10)
+        for _ in range(mix_reps):
+
+            p1000.aspirate(mix_vol, mix_bottom)
+            p1000.dispense(mix_vol, mix_top)
+        p1000.blow_out(src_well.top(-2))
+        if not own_tip:
+            p1000.drop_tip()
+        premixed_sources.add(src)
+
+    # One plasmid transfer with a fresh tip: premix the tube, then source → destination.
+    # Eppendorf tubes blow out in place; PCR wells are cleared from the top
+    def xfer(pipette, vol, src, dest):
+        pick_up_tip(pipette)
+        premix_source(src, pipette)
+        pipette.aspirate(vol, plasmid_wells[src])
+        pipette.dispense(vol, dest)
+        pipette.blow_out(dest.top(-2) if dest.parent is pcr_plate else None)
+        pipette.drop_tip()
+
+    # Greedy nearest-neighbour route: from `start`, always visit the closest remaining item next
+    def nearest_neighbour_order(start, items, position):
+        remaining = [(position(item), item) for item in items]  # positions resolved once
+        route = []
+        here = start
+        while remaining:
+            nearest = min(range(len(remaining)), key=lambda i: math.dist(here, remaining[i][0]))
+            here, item = remaining.pop(nearest)
+            route.append(item)
+        return route
+
+    def deck_xy(well):
+        point = well.top().point
+        return (point.x, point.y)
+
+    # Mix the final intermediate tube, then move the whole mix into its PCR well.
+    # reuse_tip: the pipette already holds a tip that has only touched this mix
+    def do_final_transfer(pipette, mix_vol, source_loc, volume, pcr_well, reuse_tip=False):
+        if not reuse_tip:
+            pick_up_tip(pipette)
+        pipette.mix(3, mix_vol, source_loc)
+        pipette.aspirate(volume, source_loc)
+        pipette.dispense(volume, pcr_well.bottom(1))
+        pipette.blow_out(pcr_well.top(-2))
+        pipette.drop_tip()
+
+    # Mixes of a batch go down the PCR plate column by column, alternating direction,
+    # so consecutive mixes are neighbouring wells
+    def column_serpentine(mix_data):
+        row, col = mix_data['dest_well'][0], int(mix_data['dest_well'][1:])
+        return (col, ord(row) if col % 2 else -ord(row))
+
     # --- Execute plasmid transfers ---
     for batch_start in range(0, mix_count, batch_size):
         batch_end = min(batch_start + batch_size, mix_count)
-        batch_mix_data = all_mix_data[batch_start:batch_end]
+        batch_mix_data = sorted(all_mix_data[batch_start:batch_end], key=column_serpentine)
 
         protocol.comment(f"Processing batch mixes {batch_start + 1} to {batch_end}")
 
-        premixed_sources = set()
+        premixed_sources.clear()
+
+        # Normal transfers of the whole batch, collected per source tube and run after the small volumes
+        pending_normal = defaultdict(list)  # key = source well name, value = list of [vol, dest well]
 
         for mix_data in batch_mix_data:
             dest_well = mix_data['dest_well']
 
+            # --- Volumes < 0.8 µL (×10) and normal volumes, classified at parse time ---
+            small = mix_data['small']
+            normal = mix_data['normal']
 
-            # --- Separate volumes < 0.8 µL ---
-            small_volumes = []
-            small_sources = []
-            normal_volumes = []
-            normal_sources = []
-
-            for vol, src in zip(mix_data['volumes'], mix_data['source_wells']):
-
-                plasmid_name = plasmid_well_map.get(src, "Unknown")
-
-                if plasmid_name != "NaCl (150mM)":
-                    if premix:
-                        if src not in premixed_sources:
-                            p1000.pick_up_tip(location=tips200_by_row.pop(0))
-                            counter_200 += 1
-                            mix_vol = 200
-                            mix_reps = 6
-                            protocol.comment(f"\nPremix plasmid {plasmid_name} in {src} ({mix_reps}×{mix_vol} µL)")
-
-                            for _ in range(mix_reps):
-
-                                p1000.aspirate(mix_vol, plasmid_plate[src].bottom(1))
-                                p1000.dispense(mix_vol, plasmid_plate[src].bottom(10))
-                            p1000.blow_out(plasmid_plate[src].top(-2))
-                            p1000.drop_tip()
-                            premixed_sources.add(src)
-
-            protocol.comment(f"\nTransferring to {dest_well}")
-
-            for vol, src in zip(mix_data['volumes'], mix_data['source_wells']):
-
-                plasmid_name = plasmid_well_map.get(src, "Unknown")
-                if plasmid_name == "NaCl (150mM)":
-                    continue
-
-                if 0 < vol/ mix_data['scale_factors'][0] < 0.8 :
-                    small_volumes.append(vol * 10)
-                    small_sources.append(src)
-                else:
-                    normal_volumes.append(vol)
-                    normal_sources.append(src)
-
-            has_small_volumes = len(small_volumes) > 0
-
+            run_log.append(f"\nTransferring to {dest_well}")
 
             # If small volumes exist, create intermediate mix in Eppendorf tube
-            if has_small_volumes:
-                if len(small_volumes) > 1:
+            if mix_data['has_small']:
+                if mix_data['small_count'] > 1:
                     intermediate_well_small = assigned_small_wells[dest_well]
-                    protocol.comment(f"Small volumes found → creating intermediate mix in {intermediate_well_small}")
-
-                    for vol, src in zip(small_volumes, small_sources):
-
-                        if 0 < vol <= 50:
-                            if not tips50_by_row:
-                                swap_rack50()
-                            p50.pick_up_tip(location=tips50_by_row.pop(0))
-                            counter_50 += 1
-                            counter_50_f += 1
-                            p50.aspirate(vol, plasmid_plate[src])
-                            p50.dispense(vol, plasmid_plate[intermediate_well_small])
-                            p50.blow_out()
-                            p50.drop_tip()
-                        elif 50 < vol <= 200:
-                            p1000.pick_up_tip(location=tips200_by_row.pop(0))
-                            counter_200 += 1
-                            p1000.aspirate(vol, plasmid_plate[src])
-                            p1000.dispense(vol, plasmid_plate[intermediate_well_small])
-                            p1000.blow_out()
-                            p1000.drop_tip()
+                    small_tube = plasmid_wells[intermediate_well_small]
+                    run_log.append(f"Small volumes found → creating intermediate mix in {intermediate_well_small}")
 
-                    intermediate_well_final = assigned_final_wells[dest_well]
-                    protocol.comment(f"Mix {dest_well}: final transfer → Eppendorf {intermediate_well_final}")
-
-                    total_intermediate_volume = sum(small_volumes)
-                    final_transfer = total_intermediate_volume / 10  # back to original scale
-
-                    if final_transfer <= 50:
-                        if not tips50_by_row:
-                            swap_rack50()
-                        p50.pick_up_tip(location=tips50_by_row.pop(0))
-                        counter_50 += 1
-                        counter_50_f += 1
-                        p50.mix(3, 0.8 * total_intermediate_volume, plasmid_plate[intermediate_well_small].bottom(0.1))
-                        p50.aspirate(final_transfer, plasmid_plate[intermediate_well_small].bottom(0.1))
-                        p50.dispense(final_transfer, plasmid_plate[intermediate_well_final])
-                        p50.blow_out()
-                        p50.drop_tip()
-                    else:
-                        p1000.pick_up_tip(location=tips200_by_row.pop(0))
-                        counter_200 += 1
-                        p1000.aspirate(final_transfer, plasmid_plate[intermediate_well_small].bottom(0.1))
-                        p1000.dispense(final_transfer, plasmid_plate[intermediate_well_final])
-                        p1000.blow_out()
-                        p1000.drop_tip()
+                    # Consolidate the small volumes into the intermediate tube, fresh tip per plasmid
+                    for vol, src in small:
+                        xfer(pipette_for(vol), vol, src, small_tube)
 
-                    protocol.comment(
-                        f"Transferred intermediate mix ({final_transfer} µL) from {intermediate_well_final} to {dest_well}")
+                    intermediate_well_final = assigned_final_wells[dest_well]
 
                 else:
 
                     intermediate_well_final = assigned_final_wells[dest_well]
-                    vol = small_volumes[0]/10
-                    src = small_sources[0]
+                    vol, src = small[0]
+                    vol = vol / 10
 
-                    protocol.comment(
+                    run_log.append(
                         f"Only one small volume → directly transferring to final intermediate well {intermediate_well_final}")
-                    if vol <= 0:
-                        continue
-                    if vol <= 50:
-                        if not tips50_by_row:
-                            swap_rack50()
-                        p50.pick_up_tip(location=tips50_by_row.pop(0))
-                        counter_50 += 1
-                        counter_50_f += 1
-                        p50.aspirate(vol, plasmid_plate[src])
-                        p50.dispense(vol, plasmid_plate[intermediate_well_final])
-                        p50.blow_out()
-                        p50.drop_tip()
-                    else:
-                        p1000.pick_up_tip(location=tips200_by_row.pop(0))
-                        counter_200 += 1
-                        p1000.aspirate(vol, plasmid_plate[src])
-                        p1000.dispense(vol, plasmid_plate[intermediate_well_final])
-                        p1000.blow_out()
-                        p1000.drop_tip()
-
-                for vol, src in zip(normal_volumes, normal_sources):
-                    if vol <= 0:
-                        continue
-                    pipette = p50 if vol <= 50 else p1000
-                    if pipette == p50:
-                        if not tips50_by_row:
-                            swap_rack50()
-                    pipette.pick_up_tip(location=tips50_by_row.pop(0) if pipette == p50 else tips200_by_row.pop(0))
-                    if pipette == p50:
-                        counter_50 += 1
-                        counter_50_f += 1
-                    else:
-                        counter_200 += 1
-
-                    pipette.aspirate(vol, plasmid_plate[src])
-                    pipette.dispense(vol, plasmid_plate[intermediate_well_final])
-                    pipette.blow_out(plasmid_plate[intermediate_well_final].top(-2))
-                    pipette.drop_tip()
-
-                total_volume = sum(v / mix_data['scale_factors'][0] for v in mix_data['volumes'] if v > 0)
-
-                protocol.comment(f"→ Final transfer to PCR well {dest_well} ({total_volume:.2f} µL)")
-
-                pipette = p50 if total_volume <= 50 else p1000
-
-                if pipette == p50:
-                    if not tips50_by_row:
-                        swap_rack50()
-                    pipette.pick_up_tip(location=tips50_by_row.pop(0))
-                    counter_50 += 1
-                    counter_50_f += 1
-                else:
-                    pipette.pick_up_tip(location=tips200_by_row.pop(0))
-                    counter_200 += 1
-
-                # Mixing before aspirating from intermediate_final well
-                mix_vol = min(total_volume * 0.8, 50)
-                pipette.mix(3, mix_vol, plasmid_plate[intermediate_well_final].bottom(1))
-
-                pipette.aspirate(total_volume, plasmid_plate[intermediate_well_final].bottom(1))
-                pipette.dispense(total_volume, pcr_plate[dest_well].bottom(1))
-                pipette.blow_out(pcr_plate[dest_well].top(-2))
-                pipette.drop_tip()
-
-                protocol.comment(f"✅ Final transfer for mix {dest_well} COMPLETED")
+                    xfer(pipette_for(vol), vol, src, plasmid_wells[intermediate_well_final])
 
+                normal_dest = plasmid_wells[intermediate_well_final]
             else:
+                normal_dest = pcr_wells[dest_well]
+
+            # --- Normal transfers (> 0.8 µL, excluding NaCl) are queued for the batch route ---
+            for vol, src in normal:
+                if vol > 0:
+                    # A source listed twice for the same mix is pipetted once with the summed
+                    # volume, as long as that still fits in one tip
+                    for pending in pending_normal[src]:
+                        merged = pending[0] + vol
+                        if pending[1] is normal_dest and merged <= tip_capacity[pipette_for(merged)]:
+                            pending[0] = merged
+                            break
+                    else:
+                        pending_normal[src].append([vol, normal_dest])
+
+        flush_log()
+
+        # --- Normal transfers, routed source by source ---
+        # Sources are visited nearest-first across the tube rack, and each source's
+        # destinations nearest-first from the tube, instead of in CSV order.
+        # p1000 transfers go first so the premix can use their own tip
+        sources = nearest_neighbour_order(deck_xy(plasmid_wells[next(iter(pending_normal))]), pending_normal,
+                                          lambda src: deck_xy(plasmid_wells[src])) if pending_normal else []
+        air_gap_vol = 2
+        free_dispense_min = 10  # µL; smaller drops stay on the tip when dispensed from above the liquid
+        for src in sources:
+            source = plasmid_wells[src]
+            src_xy = deck_xy(source)
+            p1000_transfers = [(vol, dest) for vol, dest in pending_normal[src] if vol > 50]
+            p50_transfers = [(vol, dest) for vol, dest in pending_normal[src] if vol <= 50]
+
+            for pipette, transfers in ((p1000, p1000_transfers), (p50, p50_transfers)):
+                route = nearest_neighbour_order(src_xy, transfers, lambda vol_dest: deck_xy(vol_dest[1]))
+
+                # Consecutive destinations of at least free_dispense_min share one aspirate while
+                # they fit in the tip, counting one air gap per destination; smaller volumes keep
+                # their own tip and are dispensed at the well bottom
+                max_vol = tip_capacity[pipette]
+                groups = []  # [total volume, [(vol, dest), ...]] per aspirate
+                for vol, dest in route:
+                    last = groups[-1] if groups else None
+                    if (last and vol >= free_dispense_min and last[1][0][0] >= free_dispense_min
+                            and last[0] + vol + air_gap_vol * (len(last[1]) + 1) <= max_vol):
+                        last[0] += vol
+                        last[1].append((vol, dest))
+                    else:
+                        groups.append([vol, [(vol, dest)]])
 
-            # --- Normal transfers (> 0.8 µL, excluding NaCl) ---
-                for vol, src in zip(normal_volumes, normal_sources):
-                    if vol <= 0:
+                for total, group in groups:
+                    if len(group) == 1:
+                        vol, dest = group[0]
+                        xfer(pipette, vol, src, dest)
                         continue
-                    pipette = p50 if vol <= 50 else p1000
-                    if pipette== p50:
-                        if not tips50_by_row:
-                            swap_rack50()
-                    pipette.pick_up_tip(location=tips50_by_row.pop(0) if pipette == p50 else tips200_by_row.pop(0))
-                    if pipette == p50:
-                        counter_50 += 1
-                        counter_50_f += 1
-                    else:
-                        counter_200 += 1
 
-                    pipette.aspirate(vol, plasmid_plate[src])
-                    pipette.dispense(vol, pcr_plate[dest_well])
-                    pipette.blow_out(pcr_plate[dest_well].top(-2))
+                    # Multi-dispense: the destinations already hold NaCl and other plasmids, so the
+                    # tip dispenses from above the liquid and never touches it. An air gap separates
+                    # the dispenses; the tip holds exactly the group's volume, and the blow-out
+                    # stays over the last well so its whole share lands there
+                    pick_up_tip(pipette)
+                    premix_source(src, pipette)
+                    pipette.aspirate(total, source)
+                    for i, (vol, dest) in enumerate(group):
+                        pipette.dispense(vol + air_gap_vol if i else vol, dest.top(-2))
+                        if i < len(group) - 1:
+                            pipette.air_gap(air_gap_vol)
+                    pipette.blow_out()
                     pipette.drop_tip()
 
+        # --- Intermediate mixes → PCR plate, once every plasmid of the batch is in ---
+        # One plan entry per mix: (mix, pipette, final tube, pipetting height in it, PCR well)
+        final_plan = []
+        for mix_data in batch_mix_data:
+            if mix_data['has_small']:
+                final_tube = plasmid_wells[assigned_final_wells[mix_data['dest_well']]]
+                final_plan.append((mix_data, pipette_for(mix_data['total_volume']), final_tube,
+                                   final_tube.bottom(1), pcr_wells[mix_data['dest_well']]))
+
+        for mix_data, pipette, final_tube, final_tube_bottom, pcr_well in final_plan:
+            dest_well = mix_data['dest_well']
+            intermediate_well_final = final_tube.well_name
+
+            # Small intermediate mix (×10) → final Eppendorf at 1/10. The tip has only touched
+            # this mix, so it carries on to the PCR transfer when the pipette is the same;
+            # otherwise the other mount takes its fresh tip now, while the gantry is at the racks
+            reuse_tip = False
+            if mix_data['small_count'] > 1:
+                small_tube_bottom = plasmid_wells[assigned_small_wells[dest_well]].bottom(0.1)
+                run_log.append(f"Mix {dest_well}: final transfer → Eppendorf {intermediate_well_final}")
+
+                total_intermediate_volume = sum(vol for vol, _ in mix_data['small'])
+                final_transfer = total_intermediate_volume / 10  # back to original scale
+
+                small_pipette = pipette_for(final_transfer)
+                pick_up_tip(small_pipette)
+                if small_pipette != pipette:
+                    pick_up_tip(pipette)
+                reuse_tip = True
+
+                # Mix volume capped at the tip size (50 µL or 200 µL)
+                mix_vol = _mix_volume(total_intermediate_volume, tip_capacity[small_pipette])
+                small_pipette.mix(3, mix_vol, small_tube_bottom)
+                small_pipette.aspirate(final_transfer, small_tube_bottom)
+                small_pipette.dispense(final_transfer, final_tube)
+                small_pipette.blow_out()
+                if small_pipette != pipette:
+                    small_pipette.drop_tip()
+
+                run_log.append(
+                    f"Transferred intermediate mix ({final_transfer} µL) from {intermediate_well_final} to {dest_well}")
+
+            run_log.append(f"→ Final transfer to PCR well {dest_well} ({mix_data['total_volume']:.2f} µL)")
+            do_final_transfer(pipette, mix_data['final_mix_vol'], final_tube_bottom, mix_data['total_volume'], pcr_well,
+                              reuse_tip=reuse_tip)
+            run_log.append(f"✅ Final transfer for mix {dest_well} COMPLETED")
+
+        flush_log()
 
     protocol.comment(f"\nProtocol complete. Created {mix_count} mixes including NaCl (150mM).")
     heater_shaker.open_labware_latch()
-    print('Tips200 used:', counter_200)
-    print('Tips50 used:', counter_50_f,'\n')
+    print('Tips200 used:', tips_used[p1000])
+    print('Tips50 used:', tips_used[p50],'\n')